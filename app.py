@@ -1,166 +1,23 @@
-import streamlit as st
-import os
-from dotenv import load_dotenv
-import time
-import json
-import requests
-from requests.adapters import HTTPAdapter
-from urllib3.util.retry import Retry
-from typing import Optional, List, Dict
-
-# --- Load Environment Variables ---
-load_dotenv()
-GEMINI_API_KEY = os.getenv("GEMINI_API_KEY")
-TMDB_API_KEY = os.getenv("TMDB_API_KEY")
-
-# --- API Configuration ---
-# Using the Gemini 2.0 Flash model endpoint for improved performance.
-GEMINI_API_URL = "https://generativelanguage.googleapis.com/v1/models/gemini-2.0-flash:generateContent"
-
-TMDB_API_BASE_URL = "https://api.themoviedb.org/3"
-TMDB_IMAGE_BASE_URL = "https://image.tmdb.org/t/p/w500"
-PLACEHOLDER_IMAGE_URL = "https://via.placeholder.com/500x750?text=Poster+Not+Available"
-
-MAX_RETRIES = 3
-RETRY_DELAY = 2  # seconds
-
-# --- Helper Functions ---
-
-def create_requests_session() -> requests.Session:
-    """Creates a requests session with retry logic."""
-    session = requests.Session()
-    retries = Retry(
-        total=MAX_RETRIES,
-        backoff_factor=1,
-        status_forcelist=[429, 500, 502, 503, 504]
-    )
-    session.mount("http://", HTTPAdapter(max_retries=retries))
-    session.mount("https://", HTTPAdapter(max_retries=retries))
-    return session
-
-def fetch_tmdb_data(movie_title: str) -> Optional[Dict]:
-    """Fetches movie poster URL and release year from TMDB for a given movie title."""
-    if not TMDB_API_KEY:
-        st.error("TMDB API key not configured.")
-        return None
-
-    session = create_requests_session()
-    try:
-        url = f"{TMDB_API_BASE_URL}/search/movie?api_key={TMDB_API_KEY}&query={movie_title}"
-        response = session.get(url, timeout=10)
-        response.raise_for_status()
-        data = response.json()
-        if data.get("results"):
-            movie = data["results"][0]
-            poster_path = movie.get("poster_path")
-            year = movie.get("release_date", "").split("-")[0]
-            return {
-                "poster_url": f"{TMDB_IMAGE_BASE_URL}{poster_path}" if poster_path else None,
-                "year": year if year else "N/A",
-            }
-        return None
-    except requests.exceptions.RequestException as e:
-        st.error(f"TMDB API Error: {e}")
-        return None
-
-def generate_recommendations(liked_movie: str, liked_aspect: str, num_recommendations: int) -> Optional[List[Dict]]:
-    """Generates movie recommendations using the Gemini API free tier with a neutral, advisory tone."""
-    if not GEMINI_API_KEY:
-        st.error("Gemini API key not found. Please check your .env file.")
-        return None
-
-    # Revised prompt: neutral and objective advisory tone.
-    prompt = (
-        f"You are a movie advisor with a neutral tone. Based on the movie '{liked_movie}', which you enjoyed for its focus on '{liked_aspect}', "
-        f"please recommend {num_recommendations} movies that would be good for someone with similar tastes. "
-        "For each movie, provide the title, a 2-3 sentence description that objectively outlines its content, and a reasoning that explains why "
-        f"this movie is a good match for someone who appreciates '{liked_aspect}'. Use neutral, advisory language as if you were suggesting a film to a friend. "
-        "Return your answer strictly as valid JSON in the following format without any additional commentary:\n\n"
-        '{\n'
-        '  "recommendations": [\n'
-        '    {\n'
-        '      "title": "Movie Title",\n'
-        '      "description": "2-3 sentence description",\n'
-        '      "reasoning": "A neutral explanation as to why this movie is a good choice for you, referencing your interest in \'{liked_aspect}\'"\n'
-        '    }\n'
-        '  ]\n'
-        '}\n'
-    )
+from pathlib import Path
 
-    payload = {
-        "contents": [
-            {
-                "role": "user",
-                "parts": [{"text": prompt}]
-            }
-        ]
-    }
-    params = {"key": GEMINI_API_KEY}
-    
-    for attempt in range(MAX_RETRIES):
-        try:
-            with st.spinner(f"Attempt {attempt + 1}/{MAX_RETRIES}: Doing the Data Dance, Fetching recommendations..."):
-                response = requests.post(GEMINI_API_URL, params=params, json=payload, timeout=20)
-                response.raise_for_status()
-                resp_json = response.json()
-                # The raw Gemini response is hidden from the user.
-
-                candidates = resp_json.get("candidates")
-                if not candidates or not isinstance(candidates, list):
-                    st.error("No candidates found in Gemini API response.")
-                    return None
-
-                candidate = candidates[0]
-                generated_text = ""
-                if "content" in candidate and "parts" in candidate["content"]:
-                    generated_text = candidate["content"]["parts"][0].get("text", "")
-                elif "output" in candidate:
-                    generated_text = candidate["output"].get("text", "")
-                else:
-                    st.error("Unexpected Gemini API response structure.")
-                    return None
-
-                if not generated_text.strip():
-                    st.error("Empty text received from Gemini API.")
-                    return None
+import streamlit as st
 
-                # Remove markdown code fences if present.
-                if generated_text.startswith("```"):
-                    lines = generated_text.splitlines()
-                    cleaned_lines = [line for line in lines if not line.strip().startswith("```")]
-                    generated_text = "\n".join(cleaned_lines).strip()
+from concurrent.futures import as_completed
 
-                try:
-                    recommendations_json = json.loads(generated_text)
-                    recommendations = recommendations_json.get("recommendations")
-                    if not recommendations:
-                        st.error("JSON response does not contain 'recommendations'.")
-                        st.code(generated_text, language='json')
-                        return None
-                    return recommendations
-                except json.JSONDecodeError as decode_error:
-                    st.error(f"Failed to decode JSON from Gemini API response: {decode_error}")
-                    st.code(generated_text, language='json')
-                    return None
+from chitra.api import generate_recommendations, submit_tmdb_batch
 
-        except Exception as e:
-            if attempt < MAX_RETRIES - 1:
-                st.warning(f"Request failed (attempt {attempt + 1}): {e}. Retrying in {RETRY_DELAY * (2 ** attempt)} seconds...")
-                time.sleep(RETRY_DELAY * (2 ** attempt))
-            else:
-                st.error(f"Failed to get recommendations after multiple retries: {e}")
-                return None
-    return None
+# Local placeholder: no third-party image host in the render path.
+PLACEHOLDER_IMAGE_PATH = Path(__file__).parent / "assets" / "placeholder.png"
 
 # --- Streamlit App Layout ---
 
 st.title("🎬 Chitra | Your Streaming Sidekick")
 st.markdown(
     """
-    Welcome to Chitra your NLP based Streaming Sidekick! Enter a movie you enjoyed and share what you liked about it (for example, the acting, storyline, or cinematography), 
+    Welcome to Chitra your NLP based Streaming Sidekick! Enter a movie you enjoyed and share what you liked about it (for example, the acting, storyline, or cinematography),
     and we'll suggest movies that might suit your taste.
-   
-   💡 The more details you provide, the more tailored and useful the recommendations will be. 
+
+   💡 The more details you provide, the more tailored and useful the recommendations will be.
     """
 )
 
@@ -168,41 +25,89 @@ with st.form("movie_form"):
     liked_movie = st.text_input("Enter a movie you liked:")
     liked_aspect = st.text_input("What did you like about it? (e.g., the acting, storyline, cinematography, etc.)")
     num_recommendations = st.number_input("Number of recommendations:", min_value=1, max_value=10, value=3)
+    show_posters = st.toggle("Show posters and release years", value=True, key="show_posters")
     submit_button = st.form_submit_button("Get Recommendations")
 
+st.session_state.setdefault("last_recs", None)
+st.session_state.setdefault("last_key", None)
+
 if submit_button:
     if not liked_movie or not liked_aspect:
         st.warning("Please enter both a movie title and details about what you liked.")
     else:
-        recommendations = generate_recommendations(liked_movie, liked_aspect, num_recommendations)
-        if recommendations:
-            st.success("Tada 👌👌, Here are your personalized movie recommendations:")
-            for idx, rec in enumerate(recommendations):
-                tmdb_data = fetch_tmdb_data(rec.get("title", ""))
-                with st.container():
-                    col1, col2 = st.columns([1, 3])
-                    with col1:
-                        if tmdb_data and tmdb_data.get("poster_url"):
-                            st.image(tmdb_data["poster_url"], width=150)
-                        else:
-                            st.markdown(
-                                """
-                                <div style="width:150px;height:225px;background-color:#ddd;
-                                display:flex;align-items:center;justify-content:center;border-radius:8px;">
-                                    <span style="color:#555;font-weight:bold;">No Image</span>
-                                </div>
-                                """, unsafe_allow_html=True
-                            )
-                    with col2:
-                        title_str = f"{idx + 1}. {rec.get('title', 'No Title')}"
-                        year_str = f" ({tmdb_data.get('year')})" if tmdb_data and tmdb_data.get("year") else ""
-                        st.markdown(f"### {title_str}{year_str}")
-                        st.write(rec.get("description", "No description available."))
-                        st.markdown("**Why you'll like it:**")
-                        st.write(rec.get("reasoning", "No reasoning provided."))
-                st.divider()
-        else:
-            st.error("Could not retrieve recommendations. Please try again later.")
+        request_key = (liked_movie, liked_aspect, num_recommendations)
+        if st.session_state["last_key"] != request_key:
+            # New inputs: pay for the Gemini round-trip and remember the
+            # result; unchanged inputs reuse the stored recommendations.
+            recommendations = generate_recommendations(liked_movie, liked_aspect, num_recommendations)
+            if recommendations:
+                st.session_state["last_key"] = request_key
+                st.session_state["last_recs"] = recommendations
+            else:
+                st.error("Could not retrieve recommendations. Please try again later.")
+
+def render_card(placeholder, idx, rec, tmdb_data):
+    """Draws one recommendation card into its placeholder."""
+    with placeholder.container():
+        col1, col2 = st.columns([1, 3])
+        with col1:
+            if tmdb_data and tmdb_data.get("poster_url"):
+                # Native lazy loading defers offscreen posters so the
+                # first cards paint without waiting on every download.
+                st.markdown(
+                    f'<img src="{tmdb_data["poster_url"]}" width="150" '
+                    'loading="lazy" decoding="async" style="border-radius:8px;" />',
+                    unsafe_allow_html=True,
+                )
+            else:
+                st.image(str(PLACEHOLDER_IMAGE_PATH), width=150)
+        with col2:
+            title_str = f"{idx + 1}. {rec.get('title', 'No Title')}"
+            # Gemini supplies the year directly; TMDB is only a fallback
+            # for older cached recommendations without one.
+            year = rec.get("year") or (tmdb_data.get("year") if tmdb_data else None)
+            year_str = f" ({year})" if year else ""
+            st.markdown(f"### {title_str}{year_str}")
+            st.write(rec.get("description", "No description available."))
+            st.markdown("**Why you'll like it:**")
+            st.write(rec.get("reasoning", "No reasoning provided."))
+        st.divider()
+
+@st.fragment
+def render_recommendations(recommendations):
+    """Renders the recommendation cards progressively.
+
+    As a fragment, interactions inside this block rerun only the cards,
+    not the whole script (form, API-key checks, etc.). Every card is
+    drawn text-first into its own placeholder, then redrawn with poster
+    and year as each TMDB future resolves — time-to-first-card no longer
+    waits on the slowest lookup.
+    """
+    st.success("Tada 👌👌, Here are your personalized movie recommendations:")
+    if st.session_state.get("show_posters", True):
+        futures = submit_tmdb_batch(recommendations)
+    else:
+        # Text-only mode skips the TMDB round-trips entirely.
+        futures = None
+    placeholders = [st.empty() for _ in recommendations]
+    for idx, rec in enumerate(recommendations):
+        render_card(placeholders[idx], idx, rec, None)
+    if futures:
+        # Duplicate titles share one future; map each back to its cards.
+        cards_by_future = {}
+        for idx, future in enumerate(futures):
+            cards_by_future.setdefault(future, []).append(idx)
+        for future in as_completed(cards_by_future):
+            tmdb_data = future.result()
+            if tmdb_data:
+                for idx in cards_by_future[future]:
+                    render_card(placeholders[idx], idx, recommendations[idx], tmdb_data)
+
+# Render from session state unconditionally so reruns triggered by other
+# widget interactions keep the last results on screen without any API call.
+recommendations = st.session_state["last_recs"]
+if recommendations:
+    render_recommendations(recommendations)
 
 st.markdown("---")
 st.markdown("Built with ❤️ by [Tushar](https://www.linkedin.com/in/tusharnain/) @ Mesa School of Business")
@@ -0,0 +1 @@
+"""Chitra - API layer for the Streamlit movie recommender."""
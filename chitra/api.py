@@ -0,0 +1,456 @@
+"""Gemini and TMDB access for Chitra.
+
+Everything network- or cache-related lives here; app.py stays a thin
+Streamlit UI layer on top of these helpers.
+"""
+
+import streamlit as st
+import os
+from dotenv import load_dotenv
+import re
+
+import httpx
+import orjson
+from concurrent.futures import Future, ThreadPoolExecutor
+from functools import lru_cache
+from tenacity import retry, retry_if_exception, stop_after_attempt, wait_exponential
+from typing import Optional, List, Dict
+
+# --- Load Environment Variables ---
+load_dotenv()
+GEMINI_API_KEY = os.getenv("GEMINI_API_KEY")
+TMDB_API_KEY = os.getenv("TMDB_API_KEY")
+# v4 read token, preferred over the v3 api_key query param: the key no
+# longer varies the URL (better shared/CDN caching) and auth rides the
+# header alongside HTTP/2 connection reuse.
+TMDB_READ_TOKEN = os.getenv("TMDB_READ_TOKEN")
+TMDB_CONFIGURED = bool(TMDB_READ_TOKEN or TMDB_API_KEY)
+
+# --- API Configuration ---
+# Using the Gemini 2.0 Flash model endpoint for improved performance.
+# The streaming endpoint starts delivering tokens as soon as generation
+# begins instead of buffering the whole completion server-side. v1beta
+# is required for structured output (responseSchema).
+GEMINI_API_URL = "https://generativelanguage.googleapis.com/v1beta/models/gemini-2.0-flash:streamGenerateContent"
+
+TMDB_API_BASE_URL = "https://api.themoviedb.org/3"
+TMDB_IMAGE_BASE_URL = "https://image.tmdb.org/t/p/w500"
+
+# Constant request params are built once at import; per-call code only
+# adds the variable query term. With a read token the key stays out of
+# the query string entirely.
+_TMDB_AUTH_PARAMS = {} if TMDB_READ_TOKEN else {"api_key": TMDB_API_KEY}
+_TMDB_HEADERS = {"Authorization": f"Bearer {TMDB_READ_TOKEN}"} if TMDB_READ_TOKEN else None
+_TMDB_SEARCH_PARAMS = {
+    **_TMDB_AUTH_PARAMS,
+    "include_adult": "false",
+    "language": "en-US",
+    "page": 1,
+}
+_TMDB_FIND_PARAMS = {**_TMDB_AUTH_PARAMS, "external_source": "imdb_id"}
+_GEMINI_PARAMS = {"key": GEMINI_API_KEY, "alt": "sse"}
+
+MAX_RETRIES = 3
+
+# Raw API payloads are only surfaced in the UI when debugging is on;
+# serializing multi-KB responses to the frontend is wasted work otherwise.
+DEBUG = bool(os.getenv("CHITRA_DEBUG"))
+
+# Static prompt text is built once at import; only the three dynamic
+# fields are interpolated per call. Neutral and objective advisory tone.
+_PROMPT_TEMPLATE = (
+    "You are a movie advisor with a neutral tone. The user liked the movie '{movie}' "
+    "because of its '{aspect}'. Recommend {n} movies for someone with similar tastes. "
+    'Respond with a JSON object {{"recommendations": [{{"title", "imdb_id", "year", "description", "reasoning"}}]}} where '
+    "imdb_id is the movie's IMDb identifier (like 'tt0816692', or null if unsure), year is the release year, "
+    "description objectively outlines the movie in 2-3 sentences and reasoning explains, in neutral "
+    "advisory language, why the movie suits someone who appreciates '{aspect}'."
+)
+
+# Schema enforced server-side via structured output: Gemini is
+# constrained to emit exactly this shape, so malformed-JSON retries and
+# missing-key fallbacks become dead-ends rather than common paths.
+_RESPONSE_SCHEMA = {
+    "type": "object",
+    "properties": {
+        "recommendations": {
+            "type": "array",
+            "items": {
+                "type": "object",
+                "properties": {
+                    "title": {"type": "string"},
+                    "imdb_id": {"type": "string", "nullable": True},
+                    "year": {"type": "integer"},
+                    "description": {"type": "string"},
+                    "reasoning": {"type": "string"},
+                },
+                "required": ["title", "year", "description", "reasoning"],
+            },
+        },
+    },
+    "required": ["recommendations"],
+}
+
+# Strips a leading/trailing markdown code fence in one anchored pass.
+# JSON mode means fences should never appear; this is a cheap safety net
+# that fails fast when they don't.
+_FENCE_RE = re.compile(r"\A\s*```(?:json)?\s*|\s*```\s*\Z")
+
+# Matches a completed "title" (and the adjacent "imdb_id" when present)
+# inside the partially streamed recommendation JSON, so TMDB prefetches
+# can start before generation finishes.
+_STREAM_TITLE_RE = re.compile(
+    r'"title"\s*:\s*"((?:[^"\\]|\\.)+)"(?:\s*,\s*"imdb_id"\s*:\s*(?:"(tt\d+)"|null))?'
+)
+
+def _dig(obj, *path, default=None):
+    """Walks nested dicts/lists, returning ``default`` on any missing step.
+
+    One guarded walk instead of a chain of .get() calls with throwaway
+    default dicts, and a single None check at the call site.
+    """
+    for key in path:
+        try:
+            obj = obj[key]
+        except (KeyError, IndexError, TypeError):
+            return default
+    return obj
+
+# --- HTTP / cache resources ---
+
+@st.cache_resource
+def get_http_client() -> httpx.Client:
+    """Returns one HTTP/2 client shared across all reruns and users.
+
+    One client carries both the TMDB lookups and the Gemini stream, so
+    each host keeps a single warm TLS connection across user clicks.
+    HTTP/2 multiplexes the concurrent TMDB searches over a single TLS
+    connection instead of one socket per in-flight request. A throwaway
+    warm-up request at build time pays the DNS + TLS handshake before any
+    user is waiting, so the first real lookup finds a hot socket.
+    """
+    client = httpx.Client(
+        http2=True,
+        timeout=httpx.Timeout(5.0, connect=3.0),
+        limits=httpx.Limits(max_keepalive_connections=20, max_connections=40),
+        transport=httpx.HTTPTransport(retries=MAX_RETRIES),
+    )
+    if TMDB_CONFIGURED:
+        try:
+            client.head(
+                f"{TMDB_API_BASE_URL}/configuration",
+                params=_TMDB_AUTH_PARAMS,
+                headers=_TMDB_HEADERS,
+            )
+        except httpx.HTTPError:
+            # Warm-up only; a failure here just means the first lookup
+            # pays the handshake as before.
+            pass
+    return client
+
+@st.cache_resource
+def get_tmdb_disk_cache():
+    """On-disk TMDB cache so cold starts reuse prior lookups.
+
+    st.cache_data lives in memory and clears whenever the container
+    restarts (frequent on Streamlit Cloud); this tier persists results on
+    disk, giving a RAM -> disk -> network hierarchy.
+    """
+    import diskcache
+
+    return diskcache.Cache("/tmp/tmdb_cache", size_limit=50_000_000)
+
+@st.cache_resource
+def get_seed_recommendations() -> Dict[str, List[Dict]]:
+    """Loads the precomputed recommendation seeds, once per process.
+
+    seeds.json maps a normalized "movie|aspect" key to a ready-made
+    recommendation list for the most common queries, so those requests
+    skip the Gemini round-trip entirely.
+    """
+    seeds_path = os.path.join(os.path.dirname(__file__), "seeds.json")
+    with open(seeds_path, "rb") as seeds_file:
+        return orjson.loads(seeds_file.read())
+
+@st.cache_resource
+def get_tmdb_executor() -> ThreadPoolExecutor:
+    """Shared worker pool for the TMDB fan-out, reused across reruns.
+
+    Eight workers keeps a full batch of lookups concurrent while staying
+    well inside TMDB's rate limits.
+    """
+    return ThreadPoolExecutor(max_workers=8, thread_name_prefix="tmdb")
+
+# --- TMDB ---
+
+@st.cache_data(ttl=60 * 60 * 24, max_entries=5000, show_spinner=False)
+def fetch_tmdb_data(movie_title: str, imdb_id: str = "") -> Optional[Dict]:
+    """Fetches movie poster URL and release year from TMDB.
+
+    When the model supplies an IMDb id, a deterministic /find lookup
+    replaces the fuzzy /search query; the search path remains as the
+    fallback. Results are memoized across sessions and reruns, so hot
+    titles skip the network entirely. "Not found" results (None) are
+    cached too, so a malformed title from the model never triggers repeat
+    queries. Network errors propagate so they are never memoized; the
+    batch wrapper turns them into missing entries.
+    """
+    title = (movie_title or "").strip()
+    imdb = (imdb_id or "").strip()
+    if len(title) < 2 and not imdb:
+        # A blank or one-character title can't be a meaningful search.
+        return None
+
+    cache_key = imdb or title
+    disk_cache = get_tmdb_disk_cache()
+    if cache_key in disk_cache:
+        return disk_cache[cache_key]
+
+    client = get_http_client()
+    results = []
+    if imdb:
+        response = client.get(
+            f"{TMDB_API_BASE_URL}/find/{imdb}", params=_TMDB_FIND_PARAMS, headers=_TMDB_HEADERS
+        )
+        response.raise_for_status()
+        results = orjson.loads(response.content).get("movie_results") or []
+    if not results and len(title) >= 2:
+        # Constrain the search so TMDB returns the smallest useful payload;
+        # only poster_path and release_date of the first hit are kept anyway.
+        params = {**_TMDB_SEARCH_PARAMS, "query": title}
+        response = client.get(
+            f"{TMDB_API_BASE_URL}/search/movie", params=params, headers=_TMDB_HEADERS
+        )
+        response.raise_for_status()
+        results = orjson.loads(response.content).get("results") or []
+
+    if results:
+        movie = results[0]
+        poster_path = movie.get("poster_path")
+        # Slice the year straight off "YYYY-MM-DD"; no throwaway list
+        # from split() per lookup.
+        release_date = movie.get("release_date") or ""
+        result = {
+            "poster_url": f"{TMDB_IMAGE_BASE_URL}{poster_path}" if poster_path else None,
+            "year": release_date[:4] if release_date else "N/A",
+        }
+    else:
+        result = None
+    # Misses are cached too, but briefly: a title TMDB doesn't know today
+    # (typo from the model, unreleased film) may resolve soon, while real
+    # hits are stable for a month.
+    disk_cache.set(cache_key, result, expire=86400 * 30 if result else 86400)
+    return result
+
+@lru_cache(maxsize=512)
+def _fetch_tmdb_fast(movie_title: str, imdb_id: str = "") -> Optional[Dict]:
+    """Tiny in-process LRU in front of the Streamlit cache.
+
+    st.cache_data pays hashing and pickling per hit; repeat lookups within
+    a process resolve here in a plain dict access instead. Exceptions are
+    never cached, so transient failures stay retryable.
+    """
+    return fetch_tmdb_data(movie_title, imdb_id)
+
+def _fetch_tmdb_safe(movie_title: str, imdb_id: str = "") -> Optional[Dict]:
+    """Degrades a failed TMDB lookup to a missing entry instead of an error."""
+    try:
+        return _fetch_tmdb_fast(movie_title, imdb_id)
+    except httpx.HTTPError:
+        return None
+
+def submit_tmdb_batch(recommendations: List[Dict]) -> Optional[List[Future]]:
+    """Submits TMDB lookups for a batch, returning one future per entry.
+
+    Duplicate titles share a single future, so each unique movie is
+    fetched once. Callers can consume the futures with as_completed to
+    render each card as soon as its lookup lands instead of waiting for
+    the slowest one. Returns None when no TMDB key is configured.
+    """
+    if not TMDB_CONFIGURED:
+        st.error("TMDB API key not configured.")
+        return None
+
+    # Normalized titles maximize the cache hit rate across submissions.
+    keys = [
+        ((rec.get("title") or "").strip().lower(), (rec.get("imdb_id") or "").strip())
+        for rec in recommendations
+    ]
+    executor = get_tmdb_executor()
+    # Gemini occasionally repeats a title; fetch each unique one only once.
+    future_map = {
+        key: executor.submit(_fetch_tmdb_safe, key[0], key[1])
+        for key in dict.fromkeys(keys)
+    }
+    return [future_map[key] for key in keys]
+
+def fetch_tmdb_data_batch(recommendations: List[Dict]) -> List[Optional[Dict]]:
+    """Fetches TMDB details for a whole recommendation batch at once."""
+    futures = submit_tmdb_batch(recommendations)
+    if futures is None:
+        return [None] * len(recommendations)
+    return [future.result() for future in futures]
+
+# --- Gemini ---
+
+class GeminiResponseError(ValueError):
+    """Raised when a Gemini response cannot be interpreted.
+
+    Carries the raw generated text so the UI layer can show it when
+    debugging is enabled.
+    """
+
+    def __init__(self, message: str, raw_text: str = ""):
+        super().__init__(message)
+        self.raw_text = raw_text
+
+def _retryable_gemini_error(exc: BaseException) -> bool:
+    """Transient failures worth retrying: transport drops and throttling."""
+    if isinstance(exc, httpx.HTTPStatusError):
+        return exc.response.status_code in (408, 429, 500, 502, 503, 504)
+    return isinstance(exc, httpx.TransportError)
+
+@retry(
+    retry=retry_if_exception(_retryable_gemini_error),
+    stop=stop_after_attempt(MAX_RETRIES + 1),
+    wait=wait_exponential(multiplier=1, max=8),
+    reraise=True,
+)
+def _stream_gemini(body: bytes) -> str:
+    """Streams one Gemini SSE response and returns the assembled text.
+
+    Runs on the shared HTTP/2 client, so the Gemini connection stays warm
+    between calls alongside the TMDB pool. Retried as a whole with
+    exponential backoff on throttling and transport drops; buffer state
+    is per-attempt, so a mid-stream disconnect simply restarts the
+    generation. As soon as a title is complete in the buffer, its TMDB
+    lookup is kicked off in the background so that work overlaps
+    generation.
+    """
+    text_parts: List[str] = []
+    titles_prefetched = 0
+    executor = get_tmdb_executor()
+    with get_http_client().stream(
+        "POST",
+        GEMINI_API_URL,
+        params=_GEMINI_PARAMS,
+        content=body,
+        headers={"Content-Type": "application/json"},
+        timeout=httpx.Timeout(20.0, connect=3.0),
+    ) as response:
+        response.raise_for_status()
+        for line in response.iter_lines():
+            if not line.startswith("data:"):
+                continue
+            chunk = orjson.loads(line[len("data:"):].strip())
+            for part in _dig(chunk, "candidates", 0, "content", "parts", default=()):
+                text_parts.append(part.get("text", ""))
+            if TMDB_CONFIGURED:
+                matches = _STREAM_TITLE_RE.findall("".join(text_parts))
+                for title, imdb in matches[titles_prefetched:]:
+                    # Fire-and-forget: only warms the TMDB caches, so the
+                    # later batch fetch returns instantly.
+                    executor.submit(_fetch_tmdb_safe, title.strip().lower(), imdb)
+                titles_prefetched = len(matches)
+    return "".join(text_parts)
+
+@st.cache_data(ttl=3600, max_entries=1000, show_spinner=False)
+def _generate_recommendations(liked_movie: str, liked_aspect: str, num_recommendations: int) -> List[Dict]:
+    """Calls Gemini and parses the recommendations out of its response.
+
+    Pure request + parse with no Streamlit side-effects, so results are
+    safe to cache across sessions. Raises ValueError when the response
+    cannot be interpreted; network errors propagate as-is.
+    """
+    prompt = _PROMPT_TEMPLATE.format(
+        movie=liked_movie, aspect=liked_aspect, n=num_recommendations
+    )
+
+    payload = {
+        "contents": [
+            {
+                "role": "user",
+                "parts": [{"text": prompt}]
+            }
+        ],
+        # Constrain the model to emit valid JSON, so there are no markdown
+        # fences to strip and no parse-failure retries to pay for. Latency
+        # scales with output tokens, so cap them to what N entries need.
+        "generationConfig": {
+            "responseMimeType": "application/json",
+            "responseSchema": _RESPONSE_SCHEMA,
+            "maxOutputTokens": 120 + 180 * num_recommendations,
+        },
+    }
+
+    # Serialize the body once with orjson (bytes, C-level); the same
+    # bytes are reused across any retry attempts.
+    body = orjson.dumps(payload)
+
+    # Stream the response (server-sent events) and assemble the text as
+    # chunks arrive; the JSON is parsed once after the stream completes.
+    generated_text = _FENCE_RE.sub("", _stream_gemini(body))
+    if not generated_text.strip():
+        raise GeminiResponseError("Empty text received from Gemini API.")
+
+    try:
+        recommendations_json = orjson.loads(generated_text)
+    except orjson.JSONDecodeError as decode_error:
+        # Salvage pass before giving up: trim any stray prose around the
+        # object and re-parse. Turns an occasional full resubmission
+        # (another multi-second Gemini call) into a local fix.
+        start, end = generated_text.find("{"), generated_text.rfind("}")
+        try:
+            if start < 0 or end <= start:
+                raise decode_error
+            recommendations_json = orjson.loads(generated_text[start:end + 1])
+        except orjson.JSONDecodeError:
+            raise GeminiResponseError(
+                f"Failed to decode JSON from Gemini API response: {decode_error}", generated_text
+            ) from decode_error
+    recommendations = recommendations_json.get("recommendations")
+    if not recommendations:
+        raise GeminiResponseError("JSON response does not contain 'recommendations'.", generated_text)
+    return recommendations
+
+def generate_recommendations(liked_movie: str, liked_aspect: str, num_recommendations: int) -> Optional[List[Dict]]:
+    """Generates movie recommendations, rendering progress and errors in the UI.
+
+    Thin wrapper around the cached Gemini call: cache hits skip the
+    network entirely, and Streamlit widgets never leak into the cache.
+    """
+    if not GEMINI_API_KEY:
+        st.error("Gemini API key not found. Please check your .env file.")
+        return None
+
+    # Normalize the inputs once: casing and stray whitespace don't change
+    # the question, so "Inception " and "inception" should share one
+    # cache entry (and one seed-table key) instead of two Gemini calls.
+    liked_movie = " ".join(liked_movie.lower().split())
+    liked_aspect = " ".join(liked_aspect.lower().split())
+
+    # Popular (movie, aspect) pairs are answered from the committed seed
+    # table: zero latency, zero Gemini quota. Anything else falls through
+    # to the live call.
+    seeded = get_seed_recommendations().get(f"{liked_movie}|{liked_aspect}")
+    if seeded and len(seeded) >= num_recommendations:
+        return seeded[:num_recommendations]
+
+    # The input movie's TMDB lookup is independent of generation, so it
+    # runs alongside the Gemini call. Fire-and-forget: it warms every
+    # cache tier (and the connection pool) so a franchise match in the
+    # results - or a resubmission - resolves instantly.
+    if TMDB_CONFIGURED:
+        get_tmdb_executor().submit(_fetch_tmdb_safe, liked_movie)
+
+    try:
+        with st.spinner("Doing the Data Dance, Fetching recommendations..."):
+            return _generate_recommendations(liked_movie, liked_aspect, num_recommendations)
+    except GeminiResponseError as e:
+        st.error(str(e))
+        if DEBUG and e.raw_text:
+            st.code(e.raw_text, language="json")
+        return None
+    except Exception as e:
+        st.error(f"Failed to get recommendations: {e}")
+        return None